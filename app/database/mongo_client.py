@@ -1,274 +1,240 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
 import pymongo
-from urllib.parse import quote_plus
+from pymongo import IndexModel
 from app.utils.config import settings
+from app.utils.uri import encode_mongo_uri as _encode_mongo_uri
+
+logger = logging.getLogger(__name__)
 
 _client = None
 _database = None
+_init_lock = threading.Lock()
+# Guards _ensure_locks; each collection's setup then runs under its own lock
+_ensure_lock = threading.Lock()
+_ensure_locks = {}
+# Collections whose indexes were ensured by this process
+_ensured = set()
 
-def _encode_mongo_uri(uri: str) -> str:
-    """
-    Properly encode MongoDB URI to handle special characters in username/password.
-    This is required for RFC 3986 compliance.
-    """
-    try:
-        # If the URI already contains encoded characters, return as is
-        if '%' in uri and ('@' not in uri or uri.count('@') == 1):
-            return uri
-        
-        # Parse the URI to extract components
-        if '://' not in uri:
-            return uri
-            
-        protocol, rest = uri.split('://', 1)
-        
-        # Check if there's authentication info
-        if '@' in rest:
-            auth_part, host_part = rest.split('@', 1)
-            
-            # Check if auth part contains username:password
-            if ':' in auth_part:
-                username, password = auth_part.split(':', 1)
-                # URL encode the username and password
-                encoded_username = quote_plus(username)
-                encoded_password = quote_plus(password)
-                encoded_auth = f"{encoded_username}:{encoded_password}"
-            else:
-                # Only username provided
-                encoded_auth = quote_plus(auth_part)
-            
-            return f"{protocol}://{encoded_auth}@{host_part}"
-        else:
-            # No authentication, return as is
-            return uri
-            
-    except Exception as e:
-        # If encoding fails, return original URI and let pymongo handle the error
-        print(f"Warning: Failed to encode MongoDB URI: {e}")
-        return uri
+INDEX_FINGERPRINT_ID = "index_fingerprint"
+
+# Indexes per collection, keyed by the settings attribute holding the
+# collection name. Custom index names avoid conflicts with old defaults.
+# Applied lazily by ensure_indexes_for() on a collection's first write.
+INDEX_SPEC = {
+    "patients_collection_name": [
+        ("email", {"unique": True, "name": "patients_email_unique_idx"}),
+        ("username", {"unique": True, "name": "patients_username_unique_idx"}),
+        ("user_id", {"unique": True, "name": "patients_user_id_unique_idx"}),
+        ("user_type", {"name": "patients_user_type_idx"}),
+    ],
+    "doctors_collection_name": [
+        ("email", {"unique": True, "name": "doctors_email_unique_idx"}),
+        ("username", {"unique": True, "name": "doctors_username_unique_idx"}),
+        ("user_id", {"unique": True, "name": "doctors_user_id_unique_idx"}),
+        ("user_type", {"name": "doctors_user_type_idx"}),
+        ("specialization", {"name": "doctors_specialization_idx"}),
+    ],
+    "otp_codes_collection_name": [
+        ("expires_at", {"expireAfterSeconds": 0, "name": "otp_expires_idx"}),
+    ],
+    "user_sessions_collection_name": [
+        ("session_id", {"unique": True, "name": "session_id_unique_idx"}),
+        ("user_id", {"name": "session_user_id_idx"}),
+        ("expires_at", {"expireAfterSeconds": 0, "name": "session_expires_idx"}),
+        # Compound index for user_id + is_active
+        ([("user_id", 1), ("is_active", 1)], {"name": "user_active_sessions_idx"}),
+    ],
+    "pending_users_collection_name": [
+        ("email", {"name": "pending_email_idx"}),
+        ("username", {"name": "pending_username_idx"}),
+        ("expires_at", {"expireAfterSeconds": 0, "name": "pending_expires_idx"}),
+    ],
+}
+
+# Old default index names that conflict with the named indexes above
+LEGACY_INDEX_NAMES = ("email_1", "username_1", "user_id_1", "user_type_1", "patient_id_1", "mobile_1")
+
+# Old indexes to drop, keyed like INDEX_SPEC
+LEGACY_INDEX_SPEC = {
+    "patients_collection_name": LEGACY_INDEX_NAMES,
+    "doctors_collection_name": LEGACY_INDEX_NAMES,
+}
+
+def _reset_singletons():
+    """Forget the parent's client in a forked child so it builds its own pool"""
+    global _client, _database, _init_lock, _ensure_lock, _ensure_locks
+    _client = None
+    _database = None
+    # The parent may have held any of the locks at fork time
+    _init_lock = threading.Lock()
+    _ensure_lock = threading.Lock()
+    _ensure_locks = {}
+
+# MongoClient is not fork-safe; pre-fork servers (e.g. gunicorn --preload)
+# get a fresh client per worker on its first get_database() call
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_singletons)
 
 def get_database():
     global _client, _database
     
-    if _database is None:
+    database = _database
+    if database is not None:
+        return database
+    
+    with _init_lock:
+        # Another thread may have finished initialising while we waited
+        if _database is not None:
+            return _database
+        
+        encoded_uri = None
+        client = None
         try:
             # Encode the MongoDB URI to handle special characters
             encoded_uri = _encode_mongo_uri(settings.mongo_uri)
-            _client = pymongo.MongoClient(encoded_uri)
-            _database = _client[settings.database_name]
-            
-            # Create indexes safely (skip if already exists with different options)
-            _create_indexes_safely(_database)
+            client = pymongo.MongoClient(
+                encoded_uri,
+                maxPoolSize=settings.mongo_max_pool_size,
+                minPoolSize=settings.mongo_min_pool_size,
+                maxIdleTimeMS=settings.mongo_max_idle_ms,
+                waitQueueTimeoutMS=settings.mongo_wait_queue_timeout_ms,
+                serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+                retryWrites=True,
+                appname="auth"
+            )
+            # Ping once so the pool is warm before the first real request.
+            # Best effort: the driver reconnects lazily if MongoDB is down now
+            try:
+                client.admin.command('ping')
+            except pymongo.errors.PyMongoError as e:
+                logger.warning("MongoDB warm-up ping failed, connecting lazily: %s", e)
+            database = client[settings.database_name]
             
         except Exception as e:
-            error_msg = f"Database connection failed: {str(e)}"
-            print(f"❌ {error_msg}")
-            print(f"🔍 MongoDB URI (first 50 chars): {settings.mongo_uri[:50]}...")
-            print(f"🔍 Encoded URI (first 50 chars): {encoded_uri[:50]}...")
-            raise Exception(error_msg)
+            # Don't leak the half-initialised client's pool and monitor threads
+            if client is not None:
+                client.close()
+            logger.error("Database connection failed: %s", e)
+            logger.debug("MongoDB URI (first 50 chars): %.50s...", settings.mongo_uri)
+            if encoded_uri is not None:
+                logger.debug("Encoded URI (first 50 chars): %.50s...", encoded_uri)
+            # Keep the pymongo exception type so callers can retry on it
+            raise
+        
+        # Only publish the singletons once setup has succeeded
+        _client = client
+        _database = database
     
-    return _database
+    return database
 
-def _create_indexes_safely(database):
-    """Create indexes safely, handling conflicts gracefully"""
-    try:
-        # Clean old conflicting indexes first
-        _clean_old_indexes(database)
-        
-        # Get existing indexes to avoid conflicts
-        existing_indexes = {}
-        
-        # Check patients collection indexes
-        try:
-            patients_indexes = database[settings.patients_collection_name].list_indexes()
-            existing_indexes["patients"] = [idx["name"] for idx in patients_indexes]
-        except:
-            existing_indexes["patients"] = []
-        
-        # Check doctors collection indexes
-        try:
-            doctors_indexes = database[settings.doctors_collection_name].list_indexes()
-            existing_indexes["doctors"] = [idx["name"] for idx in doctors_indexes]
-        except:
-            existing_indexes["doctors"] = []
-        
-        # Check otp_codes collection indexes
-        try:
-            otp_indexes = database[settings.otp_codes_collection_name].list_indexes()
-            existing_indexes["otp_codes"] = [idx["name"] for idx in otp_indexes]
-        except:
-            existing_indexes["otp_codes"] = []
-        
-        # Check user_sessions collection indexes
-        try:
-            session_indexes = database[settings.user_sessions_collection_name].list_indexes()
-            existing_indexes["user_sessions"] = [idx["name"] for idx in session_indexes]
-        except:
-            existing_indexes["user_sessions"] = []
-        
-        # Check pending_users collection indexes
+def ensure_indexes_for(database, collection_name: str):
+    """
+    Create a collection's indexes the first time this process writes to it.
+    Blocks on network I/O the first time, so async callers should use
+    ensure_indexes_for_async.
+    """
+    if collection_name in _ensured:
+        return
+    
+    with _ensure_lock:
+        collection_lock = _ensure_locks.setdefault(collection_name, threading.Lock())
+    
+    with collection_lock:
+        if collection_name in _ensured:
+            return
         try:
-            pending_indexes = database[settings.pending_users_collection_name].list_indexes()
-            existing_indexes["pending_users"] = [idx["name"] for idx in pending_indexes]
-        except:
-            existing_indexes["pending_users"] = []
-        
-        # Create patients collection indexes with custom names to avoid conflicts
-        if "patients_email_unique_idx" not in existing_indexes["patients"]:
-            try:
-                database[settings.patients_collection_name].create_index("email", unique=True, name="patients_email_unique_idx")
-                print("✅ Created patients email index")
-            except pymongo.errors.OperationFailure:
-                # Silently skip if exists - no warning needed
-                pass
-        
-        if "patients_username_unique_idx" not in existing_indexes["patients"]:
-            try:
-                database[settings.patients_collection_name].create_index("username", unique=True, name="patients_username_unique_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "patients_user_id_unique_idx" not in existing_indexes["patients"]:
-            try:
-                database[settings.patients_collection_name].create_index("user_id", unique=True, name="patients_user_id_unique_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "patients_user_type_idx" not in existing_indexes["patients"]:
-            try:
-                database[settings.patients_collection_name].create_index("user_type", name="patients_user_type_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        # Create doctors collection indexes with custom names to avoid conflicts
-        if "doctors_email_unique_idx" not in existing_indexes["doctors"]:
-            try:
-                database[settings.doctors_collection_name].create_index("email", unique=True, name="doctors_email_unique_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "doctors_username_unique_idx" not in existing_indexes["doctors"]:
-            try:
-                database[settings.doctors_collection_name].create_index("username", unique=True, name="doctors_username_unique_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "doctors_user_id_unique_idx" not in existing_indexes["doctors"]:
-            try:
-                database[settings.doctors_collection_name].create_index("user_id", unique=True, name="doctors_user_id_unique_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "doctors_user_type_idx" not in existing_indexes["doctors"]:
-            try:
-                database[settings.doctors_collection_name].create_index("user_type", name="doctors_user_type_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "doctors_specialization_idx" not in existing_indexes["doctors"]:
-            try:
-                database[settings.doctors_collection_name].create_index("specialization", name="doctors_specialization_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        # Create otp_codes indexes
-        if "otp_expires_idx" not in existing_indexes["otp_codes"]:
-            try:
-                database[settings.otp_codes_collection_name].create_index("expires_at", expireAfterSeconds=0, name="otp_expires_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        # Create user_sessions indexes
-        if "session_id_unique_idx" not in existing_indexes["user_sessions"]:
-            try:
-                database[settings.user_sessions_collection_name].create_index("session_id", unique=True, name="session_id_unique_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "session_user_id_idx" not in existing_indexes["user_sessions"]:
-            try:
-                database[settings.user_sessions_collection_name].create_index("user_id", name="session_user_id_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "session_expires_idx" not in existing_indexes["user_sessions"]:
-            try:
-                database[settings.user_sessions_collection_name].create_index("expires_at", expireAfterSeconds=0, name="session_expires_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        # Compound index for user_id + is_active
-        if "user_active_sessions_idx" not in existing_indexes["user_sessions"]:
-            try:
-                database[settings.user_sessions_collection_name].create_index([("user_id", 1), ("is_active", 1)], name="user_active_sessions_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        # Create pending_users indexes
-        if "pending_email_idx" not in existing_indexes["pending_users"]:
-            try:
-                database[settings.pending_users_collection_name].create_index("email", name="pending_email_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "pending_username_idx" not in existing_indexes["pending_users"]:
-            try:
-                database[settings.pending_users_collection_name].create_index("username", name="pending_username_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-        
-        if "pending_expires_idx" not in existing_indexes["pending_users"]:
-            try:
-                database[settings.pending_users_collection_name].create_index("expires_at", expireAfterSeconds=0, name="pending_expires_idx")
-            except pymongo.errors.OperationFailure:
-                pass
-            
-    except Exception as e:
-        # Silently continue - indexes will be created as needed
-        pass
+            _ensure_collection_indexes(database, collection_name)
+        except pymongo.errors.PyMongoError as e:
+            # Never fail the caller's write over index setup; retry on the next write
+            logger.warning("Index setup for %s failed, will retry: %s", collection_name, e)
+            return
+        _ensured.add(collection_name)
+
+async def ensure_indexes_for_async(database, collection_name: str):
+    """Async ensure_indexes_for that only leaves the event loop on a cache miss"""
+    if collection_name in _ensured:
+        return
+    await asyncio.to_thread(ensure_indexes_for, database, collection_name)
 
-def _clean_old_indexes(database):
+def _index_spec_hash(collection_name: str, index_specs) -> str:
+    """Fingerprint of one collection's index spec"""
+    return hashlib.sha256(json.dumps({collection_name: index_specs}, sort_keys=True).encode()).hexdigest()
+
+def _ensure_collection_indexes(database, collection_name: str):
+    """Create indexes for one collection safely, handling conflicts gracefully"""
+    collection_attr = next(
+        (attr for attr in INDEX_SPEC if getattr(settings, attr) == collection_name),
+        None
+    )
+    if collection_attr is None:
+        # No indexes defined for this collection
+        return
+    
+    # Skip index management entirely if this exact spec was already applied
+    index_specs = INDEX_SPEC[collection_attr]
+    schema_hash = _index_spec_hash(collection_name, index_specs)
+    fingerprint_id = f"{INDEX_FINGERPRINT_ID}:{collection_name}"
+    meta_collection = database[settings.meta_collection_name]
+    fingerprint = meta_collection.find_one({"_id": fingerprint_id})
+    if fingerprint and fingerprint.get("hash") == schema_hash:
+        return
+    
+    # Clean old conflicting indexes first
+    _clean_old_indexes(database, collection_name, LEGACY_INDEX_SPEC.get(collection_attr, ()))
+    
+    collection = database[collection_name]
+    index_models = [IndexModel(keys, **options) for keys, options in index_specs]
+    try:
+        # The server skips indexes that already exist with the same spec
+        collection.create_indexes(index_models)
+    except pymongo.errors.OperationFailure:
+        # createIndexes is all-or-nothing, so retry one index at a time to
+        # keep a single conflict from skipping the rest (e.g. TTL indexes)
+        all_created = True
+        for keys, options in index_specs:
+            try:
+                collection.create_index(keys, **options)
+            except pymongo.errors.OperationFailure as e:
+                # An index exists with different options - keep the existing one
+                logger.warning("Skipped index %s on %s: %s", options["name"], collection_name, e)
+                all_created = False
+        if not all_created:
+            return
+    
+    # Only record the fingerprint once every index is in place
+    meta_collection.update_one(
+        {"_id": fingerprint_id},
+        {"$set": {"hash": schema_hash}},
+        upsert=True
+    )
+
+def _clean_old_indexes(database, collection_name: str, old_index_names):
     """Clean old conflicting indexes to prevent warnings"""
+    if not old_index_names:
+        return
+    
+    collection = database[collection_name]
+    
+    # Get current indexes so only legacy indexes that exist are dropped
     try:
-        # Old index names that might conflict
-        old_indexes_to_remove = [
-            "email_1", 
-            "username_1", 
-            "user_id_1", 
-            "user_type_1",
-            "patient_id_1",
-            "mobile_1"
-        ]
-        
-        # Collections to clean
-        collections_to_clean = [
-            settings.patients_collection_name,
-            settings.doctors_collection_name
-        ]
-        
-        for collection_name in collections_to_clean:
-            collection = database[collection_name]
-            
-            # Get current indexes
+        current_indexes = {idx["name"] for idx in collection.list_indexes()}
+    except pymongo.errors.OperationFailure:
+        # Collection might not exist yet
+        return
+    
+    for old_index in old_index_names:
+        if old_index in current_indexes:
             try:
-                current_indexes = [idx["name"] for idx in collection.list_indexes()]
-                
-                # Remove conflicting old indexes
-                for old_index in old_indexes_to_remove:
-                    if old_index in current_indexes:
-                        try:
-                            collection.drop_index(old_index)
-                            print(f"🧹 Cleaned old index: {old_index} from {collection_name}")
-                        except Exception:
-                            # Index might be in use or already dropped
-                            pass
-                            
-            except Exception:
-                # Collection might not exist yet
+                collection.drop_index(old_index)
+                logger.info("Cleaned old index: %s from %s", old_index, collection_name)
+            except pymongo.errors.OperationFailure:
+                # Index might be in use or already dropped
                 pass
-                
-    except Exception:
-        # Cleanup failed, but continue with index creation
-        pass
 
 def close_database():
     global _client
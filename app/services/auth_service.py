@@ -3,7 +3,7 @@ import random
 import string
 import uuid
 from datetime import datetime, timedelta
-from app.database.mongo_client import get_database
+from app.database.mongo_client import get_database, ensure_indexes_for_async
 from app.utils.security import create_access_token, verify_password, hash_password
 from app.models.auth_models import UserRegister
 from app.utils.config import settings
@@ -13,13 +13,31 @@ from app.utils.exceptions import (
 )
 
 class AuthService:
-    def __init__(self):
-        self.db = get_database()
-        self.patients_collection = self.db[settings.patients_collection_name]
-        self.doctors_collection = self.db[settings.doctors_collection_name]
-        self.pending_users_collection = self.db[settings.pending_users_collection_name]
-        self.otp_collection = self.db[settings.otp_codes_collection_name]
-        self.sessions_collection = self.db[settings.user_sessions_collection_name]
+    # Database handles are resolved through get_database() on each access so
+    # a worker forked after this service was created uses its own client
+    @property
+    def db(self):
+        return get_database()
+
+    @property
+    def patients_collection(self):
+        return self.db[settings.patients_collection_name]
+
+    @property
+    def doctors_collection(self):
+        return self.db[settings.doctors_collection_name]
+
+    @property
+    def pending_users_collection(self):
+        return self.db[settings.pending_users_collection_name]
+
+    @property
+    def otp_collection(self):
+        return self.db[settings.otp_codes_collection_name]
+
+    @property
+    def sessions_collection(self):
+        return self.db[settings.user_sessions_collection_name]
 
     async def register_user(self, user_data: UserRegister):
         # Validate user type
@@ -110,6 +128,7 @@ class AuthService:
             pending_user_doc["specialization"] = user_data.specialization
         
         # Store in pending_users collection (not the actual users collection yet)
+        await ensure_indexes_for_async(self.db, settings.pending_users_collection_name)
         self.pending_users_collection.insert_one(pending_user_doc)
         
         # Generate and send OTP automatically
@@ -165,6 +184,7 @@ class AuthService:
             "expires_at": datetime.utcnow() + timedelta(minutes=30),
             "is_active": True
         }
+        await ensure_indexes_for_async(self.db, settings.user_sessions_collection_name)
         self.sessions_collection.insert_one(session_doc)
         
         # Create access token with session info
@@ -207,6 +227,7 @@ class AuthService:
             "expires_at": datetime.utcnow() + timedelta(minutes=10)
         }
         
+        await ensure_indexes_for_async(self.db, settings.otp_codes_collection_name)
         self.otp_collection.insert_one(otp_doc)
         
         # Send OTP via email
@@ -259,8 +280,10 @@ class AuthService:
         
         # Insert into appropriate collection based on user type
         if pending_user["user_type"] == "patient":
+            await ensure_indexes_for_async(self.db, settings.patients_collection_name)
             self.patients_collection.insert_one(user_doc)
         else:  # doctor
+            await ensure_indexes_for_async(self.db, settings.doctors_collection_name)
             self.doctors_collection.insert_one(user_doc)
         
         # Remove from pending users
@@ -297,6 +320,7 @@ class AuthService:
             "expires_at": datetime.utcnow() + timedelta(minutes=10)
         }
         
+        await ensure_indexes_for_async(self.db, settings.otp_codes_collection_name)
         self.otp_collection.insert_one(otp_doc)
         
         # Send password reset OTP via email
@@ -23,7 +23,15 @@ class Config:
                         "doctors": "doctor_v2",
                         "pending_users": "pending_users",
                         "otp_codes": "otp_codes",
-                        "user_sessions": "user_sessions"
+                        "user_sessions": "user_sessions",
+                        "meta": "_meta"
+                    },
+                    "pool": {
+                        "max_size": 50,
+                        "min_size": 5,
+                        "max_idle_ms": 300000,
+                        "wait_queue_timeout_ms": 10000,
+                        "server_selection_timeout_ms": 5000
                     }
                 },
                 "jwt": {"algorithm": "HS256", "expire_minutes": 30},
@@ -52,6 +60,27 @@ class Config:
     def database_name(self) -> str:
         return self.get('database.database_name', 'patients_db')
     
+    # Connection pool settings
+    @property
+    def mongo_max_pool_size(self) -> int:
+        return int(os.getenv('MONGO_MAX_POOL_SIZE', self.get('database.pool.max_size', 50)))
+    
+    @property
+    def mongo_min_pool_size(self) -> int:
+        return int(os.getenv('MONGO_MIN_POOL_SIZE', self.get('database.pool.min_size', 5)))
+    
+    @property
+    def mongo_max_idle_ms(self) -> int:
+        return int(os.getenv('MONGO_MAX_IDLE_MS', self.get('database.pool.max_idle_ms', 300000)))
+    
+    @property
+    def mongo_wait_queue_timeout_ms(self) -> int:
+        return int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', self.get('database.pool.wait_queue_timeout_ms', 10000)))
+    
+    @property
+    def mongo_server_selection_timeout_ms(self) -> int:
+        return int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', self.get('database.pool.server_selection_timeout_ms', 5000)))
+    
     # JWT settings
     @property
     def jwt_secret(self) -> str:
@@ -134,4 +163,8 @@ class Config:
     def user_sessions_collection_name(self) -> str:
         return self.get('database.collections.user_sessions', 'user_sessions')
 
+    @property
+    def meta_collection_name(self) -> str:
+        return self.get('database.collections.meta', '_meta')
+
 settings = Config()
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+MongoDB URI helpers shared by the database client and the encoder script
+"""
+import logging
+import re
+from functools import lru_cache
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# protocol://[username[:password]@]rest
+_URI_RE = re.compile(r'^([^:]+)://(?:([^:@]*)(?::([^@]*))?@)?(.*)$')
+
+@lru_cache(maxsize=4)
+def encode_mongo_uri(uri: str) -> str:
+    """
+    Properly encode MongoDB URI to handle special characters in username/password.
+    This is required for RFC 3986 compliance.
+    """
+    try:
+        # If the URI already contains encoded characters, return as is
+        if '%' in uri and uri.count('@') <= 1:
+            return uri
+        
+        # Parse protocol, optional username:password and the rest in one pass
+        match = _URI_RE.match(uri)
+        if match is None:
+            return uri
+        
+        protocol, username, password, host_part = match.groups()
+        if username is None:
+            # No authentication, return as is
+            return uri
+        
+        # URL encode the username and password
+        encoded_auth = quote(username, safe='')
+        if password is not None:
+            encoded_auth = f"{encoded_auth}:{quote(password, safe='')}"
+        
+        return f"{protocol}://{encoded_auth}@{host_part}"
+            
+    except Exception as e:
+        # If encoding fails, return original URI and let pymongo handle the error
+        logger.warning("Failed to encode MongoDB URI: %s", e)
+        return uri
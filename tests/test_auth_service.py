@@ -2,7 +2,7 @@ import pytest
 import asyncio
 import sys
 import os
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
 from datetime import datetime, timedelta
 
 # Add the parent directory to the Python path
@@ -10,6 +10,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.services.auth_service import AuthService
 from app.models.auth_models import UserRegister
+from app.utils.config import settings
+import app.database.mongo_client as mongo_client
 
 class TestAuthService:
     
@@ -323,3 +325,95 @@ class TestAuthService:
             auth_service._generate_user_id("invalid")
         
         assert "Invalid user type" in str(exc_info.value)
+
+
+class TestAuthServiceDatabaseHandles:
+
+    @pytest.fixture(autouse=True)
+    def reset_singletons(self):
+        """Reset the cached client/database between tests"""
+        mongo_client._reset_singletons()
+        mongo_client._ensured.clear()
+        yield
+        mongo_client._reset_singletons()
+        mongo_client._ensured.clear()
+
+    @patch('app.database.mongo_client.pymongo.MongoClient')
+    def test_service_uses_new_client_after_fork_reset(self, mock_client_cls):
+        """Test that a service created before a fork uses the child's new client"""
+        parent_client, child_client = MagicMock(), MagicMock()
+        mock_client_cls.side_effect = [parent_client, child_client]
+
+        service = AuthService()
+        assert service.db is parent_client[settings.database_name]
+
+        mongo_client._reset_singletons()
+
+        child_db = child_client[settings.database_name]
+        assert service.db is child_db
+        assert service.patients_collection is child_db[settings.patients_collection_name]
+        assert mock_client_cls.call_count == 2
+
+    @pytest.fixture
+    def write_order(self):
+        """Database mock that records index ensures and inserts in call order"""
+        calls = []
+        collections = {}
+
+        def get_collection(name):
+            if name not in collections:
+                collection = MagicMock()
+                collection.find_one.return_value = None
+                collection.insert_one.side_effect = lambda doc, name=name: calls.append(("insert", name))
+                collections[name] = collection
+            return collections[name]
+
+        mock_db = MagicMock()
+        mock_db.__getitem__.side_effect = get_collection
+
+        async def ensure(database, collection_name):
+            calls.append(("ensure", collection_name))
+
+        with patch('app.services.auth_service.get_database', return_value=mock_db), \
+             patch('app.services.auth_service.ensure_indexes_for_async', side_effect=ensure):
+            yield calls, collections
+
+    @pytest.mark.asyncio
+    @patch('app.services.email_service.EmailService.send_otp_email')
+    async def test_generate_otp_ensures_indexes_before_insert(self, mock_send_email, write_order):
+        """Test that OTP writes ensure the otp_codes indexes before inserting"""
+        calls, collections = write_order
+        patients = MagicMock()
+        patients.find_one.return_value = {"email": "test@test.com"}
+        collections[settings.patients_collection_name] = patients
+        mock_send_email.return_value = None
+
+        await AuthService().generate_otp("test@test.com")
+
+        assert calls == [
+            ("ensure", settings.otp_codes_collection_name),
+            ("insert", settings.otp_codes_collection_name)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_register_user_ensures_indexes_before_insert(self, write_order):
+        """Test that registration ensures the pending_users indexes before inserting"""
+        calls, _ = write_order
+        service = AuthService()
+        user_data = UserRegister(
+            username="newpatient",
+            email="new@test.com",
+            mobile="1234567890",
+            password="password123",
+            first_name="New",
+            last_name="Patient",
+            user_type="patient"
+        )
+
+        with patch.object(AuthService, 'generate_otp', return_value="123456"):
+            await service.register_user(user_data)
+
+        assert calls == [
+            ("ensure", settings.pending_users_collection_name),
+            ("insert", settings.pending_users_collection_name)
+        ]
@@ -79,6 +79,36 @@ class TestConfig:
         # Environment variable should take precedence
         assert config.port == 9000
     
+    @patch('builtins.open', mock_open(read_data='{"database": {"pool": {"max_size": 20, "wait_queue_timeout_ms": 2000}}}'))
+    def test_mongo_pool_settings(self):
+        """Test MongoDB connection pool settings from JSON configuration"""
+        config = Config()
+
+        assert config.mongo_max_pool_size == 20
+        assert config.mongo_wait_queue_timeout_ms == 2000
+        # Unset values fall back to defaults
+        assert config.mongo_min_pool_size == 5
+        assert config.mongo_max_idle_ms == 300000
+        assert config.mongo_server_selection_timeout_ms == 5000
+
+    @patch.dict(os.environ, {
+        'MONGO_MAX_POOL_SIZE': '200',
+        'MONGO_MIN_POOL_SIZE': '10',
+        'MONGO_MAX_IDLE_MS': '60000',
+        'MONGO_WAIT_QUEUE_TIMEOUT_MS': '3000',
+        'MONGO_SERVER_SELECTION_TIMEOUT_MS': '8000'
+    })
+    @patch('builtins.open', mock_open(read_data='{"database": {"pool": {"max_size": 20, "max_idle_ms": 1000}}}'))
+    def test_mongo_pool_environment_override(self):
+        """Test that MONGO_* pool environment variables override JSON config"""
+        config = Config()
+
+        assert config.mongo_max_pool_size == 200
+        assert config.mongo_min_pool_size == 10
+        assert config.mongo_max_idle_ms == 60000
+        assert config.mongo_wait_queue_timeout_ms == 3000
+        assert config.mongo_server_selection_timeout_ms == 8000
+
     @patch.dict(os.environ, {'DEBUG': 'true'})
     def test_debug_environment_variable(self):
         """Test debug mode from environment variable"""
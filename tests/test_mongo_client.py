@@ -0,0 +1,285 @@
+import pytest
+import threading
+from unittest.mock import MagicMock, patch
+from pymongo.errors import AutoReconnect, ConfigurationError, InvalidName, OperationFailure, ServerSelectionTimeoutError
+import app.database.mongo_client as mongo_client
+
+class TestMongoClient:
+
+    @pytest.fixture(autouse=True)
+    def reset_singletons(self):
+        """Reset the cached client/database and ensured collections between tests"""
+        mongo_client._client = None
+        mongo_client._database = None
+        mongo_client._ensured.clear()
+        yield
+        mongo_client._client = None
+        mongo_client._database = None
+        mongo_client._ensured.clear()
+
+    @patch('app.database.mongo_client.pymongo.MongoClient')
+    def test_get_database_returns_cached_instance(self, mock_client_cls):
+        """Test that get_database only connects once"""
+        first = mongo_client.get_database()
+        second = mongo_client.get_database()
+
+        assert first is second
+        mock_client_cls.assert_called_once()
+
+    @patch('app.database.mongo_client.pymongo.MongoClient')
+    def test_get_database_passes_pool_settings(self, mock_client_cls):
+        """Test that connection pool settings are passed to MongoClient"""
+        mongo_client.get_database()
+
+        kwargs = mock_client_cls.call_args.kwargs
+        assert kwargs["maxPoolSize"] == mongo_client.settings.mongo_max_pool_size
+        assert kwargs["minPoolSize"] == mongo_client.settings.mongo_min_pool_size
+        assert kwargs["maxIdleTimeMS"] == mongo_client.settings.mongo_max_idle_ms
+        assert kwargs["waitQueueTimeoutMS"] == mongo_client.settings.mongo_wait_queue_timeout_ms
+        assert kwargs["serverSelectionTimeoutMS"] == mongo_client.settings.mongo_server_selection_timeout_ms
+        assert kwargs["retryWrites"] is True
+        mock_client_cls.return_value.admin.command.assert_called_once_with('ping')
+
+    @patch('app.database.mongo_client.pymongo.MongoClient')
+    def test_get_database_concurrent_calls_create_single_client(self, mock_client_cls):
+        """Test that concurrent first calls do not create duplicate clients"""
+        barrier = threading.Barrier(8)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(mongo_client.get_database())
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 8
+        assert all(result is results[0] for result in results)
+        mock_client_cls.assert_called_once()
+
+    @patch('app.database.mongo_client._encode_mongo_uri', side_effect=ValueError("bad uri"))
+    def test_get_database_reports_encoding_failure(self, mock_encode):
+        """Test that a failure before the URI is encoded is reported, not masked"""
+        with pytest.raises(ValueError, match="bad uri"):
+            mongo_client.get_database()
+
+        assert mongo_client._database is None
+
+    @patch('app.database.mongo_client.pymongo.MongoClient')
+    def test_get_database_tolerates_failed_ping(self, mock_client_cls):
+        """Test that an unreachable server at startup does not fail get_database"""
+        mock_client_cls.return_value.admin.command.side_effect = ServerSelectionTimeoutError("no servers")
+
+        database = mongo_client.get_database()
+
+        assert database is mock_client_cls.return_value[mongo_client.settings.database_name]
+        assert mongo_client._client is mock_client_cls.return_value
+
+    @patch('app.database.mongo_client.pymongo.MongoClient', side_effect=ConfigurationError("bad option"))
+    def test_get_database_preserves_pymongo_error(self, mock_client_cls):
+        """Test that connection errors propagate with their original pymongo type"""
+        with pytest.raises(ConfigurationError):
+            mongo_client.get_database()
+
+        assert mongo_client._database is None
+
+    @patch('app.database.mongo_client.pymongo.MongoClient')
+    def test_get_database_closes_client_on_failure(self, mock_client_cls):
+        """Test that a client whose setup fails is closed rather than leaked"""
+        mock_client_cls.return_value.__getitem__.side_effect = InvalidName("bad database name")
+
+        with pytest.raises(InvalidName):
+            mongo_client.get_database()
+
+        mock_client_cls.return_value.close.assert_called_once()
+
+    @patch('app.database.mongo_client.pymongo.MongoClient')
+    def test_get_database_publishes_nothing_until_setup_succeeds(self, mock_client_cls):
+        """Test that a failed setup leaves no singleton behind and the next call retries"""
+        mock_client_cls.return_value.__getitem__.side_effect = [InvalidName("bad database name"), MagicMock()]
+
+        with pytest.raises(InvalidName):
+            mongo_client.get_database()
+
+        assert mongo_client._client is None
+        assert mongo_client._database is None
+
+        database = mongo_client.get_database()
+
+        assert mongo_client._database is database
+        assert mongo_client._client is mock_client_cls.return_value
+        assert mock_client_cls.call_count == 2
+
+    @patch('app.database.mongo_client.pymongo.MongoClient')
+    def test_reset_singletons_forces_new_client(self, mock_client_cls):
+        """Test that the post-fork reset makes the next call build a new client"""
+        mongo_client.get_database()
+        mongo_client._reset_singletons()
+        mongo_client.get_database()
+
+        assert mock_client_cls.call_count == 2
+        assert mongo_client._client is mock_client_cls.return_value
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock database returning one mock per collection name"""
+        mock_db = MagicMock()
+        collections = {}
+        mock_db.__getitem__.side_effect = lambda name: collections.setdefault(name, MagicMock())
+        mock_db[mongo_client.settings.meta_collection_name].find_one.return_value = None
+        return mock_db
+
+    def test_ensure_indexes_for_creates_collection_indexes_once(self, mock_db):
+        """Test that a collection's indexes are created in one command, once per process"""
+        patients_name = mongo_client.settings.patients_collection_name
+
+        mongo_client.ensure_indexes_for(mock_db, patients_name)
+        mongo_client.ensure_indexes_for(mock_db, patients_name)
+
+        patients = mock_db[patients_name]
+        patients.create_indexes.assert_called_once()
+        index_names = [model.document["name"] for model in patients.create_indexes.call_args.args[0]]
+        assert "patients_email_unique_idx" in index_names
+        mock_db[mongo_client.settings.doctors_collection_name].create_indexes.assert_not_called()
+
+    def test_ensure_indexes_for_skipped_when_fingerprint_matches(self, mock_db):
+        """Test that index management is skipped when the stored fingerprint matches"""
+        otp_name = mongo_client.settings.otp_codes_collection_name
+        mock_db[mongo_client.settings.meta_collection_name].find_one.return_value = {
+            "hash": mongo_client._index_spec_hash(otp_name, mongo_client.INDEX_SPEC["otp_codes_collection_name"])
+        }
+
+        mongo_client.ensure_indexes_for(mock_db, otp_name)
+
+        mock_db[otp_name].create_indexes.assert_not_called()
+        assert otp_name in mongo_client._ensured
+
+    def test_ensure_indexes_for_records_fingerprint(self, mock_db):
+        """Test that the collection fingerprint is stored after indexes are created"""
+        sessions_name = mongo_client.settings.user_sessions_collection_name
+
+        mongo_client.ensure_indexes_for(mock_db, sessions_name)
+
+        mock_db[mongo_client.settings.meta_collection_name].update_one.assert_called_once_with(
+            {"_id": f"{mongo_client.INDEX_FINGERPRINT_ID}:{sessions_name}"},
+            {"$set": {"hash": mongo_client._index_spec_hash(
+                sessions_name, mongo_client.INDEX_SPEC["user_sessions_collection_name"]
+            )}},
+            upsert=True
+        )
+
+    def test_ensure_indexes_for_conflict_skips_fingerprint(self, mock_db):
+        """Test that an index conflict is tolerated but the fingerprint is not recorded"""
+        doctors_name = mongo_client.settings.doctors_collection_name
+        mock_db[doctors_name].create_indexes.side_effect = OperationFailure("Index already exists with different options")
+        mock_db[doctors_name].create_index.side_effect = OperationFailure("Index already exists with different options")
+
+        mongo_client.ensure_indexes_for(mock_db, doctors_name)
+
+        mock_db[mongo_client.settings.meta_collection_name].update_one.assert_not_called()
+        assert doctors_name in mongo_client._ensured
+
+    def test_ensure_indexes_for_conflict_still_creates_other_indexes(self, mock_db):
+        """Test that one conflicting index does not skip the rest of the collection's indexes"""
+        sessions_name = mongo_client.settings.user_sessions_collection_name
+        sessions = mock_db[sessions_name]
+        sessions.create_indexes.side_effect = OperationFailure("Index already exists with different options")
+
+        def create_index(keys, **options):
+            if options["name"] == "session_user_id_idx":
+                raise OperationFailure("Index already exists with different options")
+            return options["name"]
+
+        sessions.create_index.side_effect = create_index
+
+        mongo_client.ensure_indexes_for(mock_db, sessions_name)
+
+        attempted = [call.kwargs["name"] for call in sessions.create_index.call_args_list]
+        assert attempted == [options["name"] for _, options in mongo_client.INDEX_SPEC["user_sessions_collection_name"]]
+        assert "session_expires_idx" in attempted
+        mock_db[mongo_client.settings.meta_collection_name].update_one.assert_not_called()
+
+    def test_ensure_indexes_for_retries_after_connection_error(self, mock_db):
+        """Test that a connection error is swallowed and the next write retries"""
+        pending_name = mongo_client.settings.pending_users_collection_name
+        meta = mock_db[mongo_client.settings.meta_collection_name]
+        meta.find_one.side_effect = [AutoReconnect("connection reset"), None]
+
+        mongo_client.ensure_indexes_for(mock_db, pending_name)
+
+        assert pending_name not in mongo_client._ensured
+        mock_db[pending_name].create_indexes.assert_not_called()
+
+        mongo_client.ensure_indexes_for(mock_db, pending_name)
+
+        assert pending_name in mongo_client._ensured
+        mock_db[pending_name].create_indexes.assert_called_once()
+
+    def test_ensure_indexes_for_locks_per_collection(self, mock_db):
+        """Test that a slow index build on one collection does not block another"""
+        patients_name = mongo_client.settings.patients_collection_name
+        doctors_name = mongo_client.settings.doctors_collection_name
+        patients_started = threading.Event()
+        release_patients = threading.Event()
+
+        def slow_create_indexes(models):
+            patients_started.set()
+            release_patients.wait(timeout=5)
+
+        mock_db[patients_name].create_indexes.side_effect = slow_create_indexes
+        patients_thread = threading.Thread(target=mongo_client.ensure_indexes_for, args=(mock_db, patients_name))
+        patients_thread.start()
+        assert patients_started.wait(timeout=5)
+
+        try:
+            mongo_client.ensure_indexes_for(mock_db, doctors_name)
+
+            assert doctors_name in mongo_client._ensured
+            assert patients_name not in mongo_client._ensured
+        finally:
+            release_patients.set()
+            patients_thread.join(timeout=5)
+
+        assert patients_name in mongo_client._ensured
+
+    @pytest.mark.asyncio
+    async def test_ensure_indexes_for_async_skips_thread_once_ensured(self, mock_db):
+        """Test that the async wrapper only hands off to a thread on a cache miss"""
+        otp_name = mongo_client.settings.otp_codes_collection_name
+
+        with patch('app.database.mongo_client.asyncio.to_thread', wraps=mongo_client.asyncio.to_thread) as mock_to_thread:
+            await mongo_client.ensure_indexes_for_async(mock_db, otp_name)
+            await mongo_client.ensure_indexes_for_async(mock_db, otp_name)
+
+        mock_to_thread.assert_called_once_with(mongo_client.ensure_indexes_for, mock_db, otp_name)
+        assert otp_name in mongo_client._ensured
+
+    def test_ensure_indexes_for_unknown_collection(self, mock_db):
+        """Test that collections without an index spec are left alone"""
+        mongo_client.ensure_indexes_for(mock_db, "audit_log")
+
+        mock_db["audit_log"].create_indexes.assert_not_called()
+        mock_db[mongo_client.settings.meta_collection_name].find_one.assert_not_called()
+
+    def test_clean_old_indexes_drops_only_existing_legacy_names(self, mock_db):
+        """Test that only legacy index names present on a collection are dropped"""
+        patients_name = mongo_client.settings.patients_collection_name
+        patients = mock_db[patients_name]
+        patients.list_indexes.return_value = [{"name": "_id_"}, {"name": "email_1"}, {"name": "patients_email_unique_idx"}]
+
+        mongo_client._clean_old_indexes(mock_db, patients_name, mongo_client.LEGACY_INDEX_NAMES)
+
+        patients.drop_index.assert_called_once_with("email_1")
+
+    def test_clean_old_indexes_missing_collection(self, mock_db):
+        """Test that a collection that cannot be listed is skipped"""
+        doctors_name = mongo_client.settings.doctors_collection_name
+        doctors = mock_db[doctors_name]
+        doctors.list_indexes.side_effect = OperationFailure("ns does not exist")
+
+        mongo_client._clean_old_indexes(mock_db, doctors_name, mongo_client.LEGACY_INDEX_NAMES)
+
+        doctors.drop_index.assert_not_called()